@@ -11,19 +11,164 @@
 """
 
 
+import itertools
+import multiprocessing
+
 import numpy as np
 import h5py as hp
 import pybinding as pb
 
-from scipy.sparse import coo_matrix
 from scipy.spatial import cKDTree
 
 
+def _aslist(obj):
+    """Normalize an optional object or a list of objects, like the disorder arguments, to a sequence."""
+    if isinstance(obj, (list, tuple)):
+        return obj
+    return () if obj is None else (obj,)
+
+
+def _ds(grp, name, data, dtype, shape=None):
+    """Write a small contiguous dataset, without times in its object header, through the low level h5py API."""
+    data = np.asarray(data, dtype=dtype)
+    if shape is not None:
+        data = data.reshape(shape)
+    data = np.ascontiguousarray(data)
+    dcpl = hp.h5p.create(hp.h5p.DATASET_CREATE)
+    dcpl.set_obj_track_times(False)
+    dset_id = hp.h5d.create(grp.id, name.encode(), hp.h5t.py_create(data.dtype), hp.h5s.create_simple(data.shape),
+                            dcpl=dcpl)
+    dset_id.write(hp.h5s.ALL, hp.h5s.ALL, data)
+
+
+# fields of the Calculation groups with a single value per request, as (dataset name, request key, dtype, scaled),
+# where the scaled fields are energies that are divided by the energy scale
+_CALC_FIELDS_DOS = (('NumMoments', 'num_moments', np.int32, False), ('NumRandoms', 'num_random', np.int32, False),
+                    ('NumPoints', 'num_points', np.int32, False), ('NumDisorder', 'num_disorder', np.int32, False))
+_CALC_FIELDS_COND = _CALC_FIELDS_DOS + (('Temperature', 'temperature', np.float64, True),
+                                        ('Direction', 'direction', np.int32, False))
+_CALC_FIELDS_NONLINEAR = _CALC_FIELDS_COND + (('Special', 'special', np.int32, False),)
+_CALC_FIELDS_SINGLESHOT = (('NumRandoms', 'num_random', np.int32, False),
+                           ('NumDisorder', 'num_disorder', np.int32, False),
+                           ('Direction', 'direction', np.int32, False))
+
+
+def _write_calc_group(grpc, name, entry, field_specs, inv_scale):
+    """Create the group of a requested Calculation function and write each single value field of the request as a (1,)
+    dataset. Returns the group for the fields that are not single values."""
+    grpc_p = grpc.create_group(name)
+    for ds_name, key, dtype, scaled in field_specs:
+        _ds(grpc_p, ds_name, entry[key] * inv_scale if scaled else entry[key], dtype, shape=(1,))
+    return grpc_p
+
+
+def _broadcast4(a, b, c, d):
+    """Broadcast the four 1D arrays of a singleshot request to their common length as views, where each of them either
+    has that length or is a single value."""
+    arrays = (a, b, c, d)
+    lengths = tuple(arr.size for arr in arrays)
+    max_length = max(lengths)
+
+    # check if lenghts are consistent, each of them is either the max length or a single value
+    if any(length not in (max_length, 1) for length in lengths):
+        raise SystemExit('Number of moments, eta, energy and preserve_disorder should either have the same '
+                         'length or specified as a single value! Choose them accordingly.')
+
+    return tuple(np.broadcast_to(arr, max_length) for arr in arrays)
+
+
+def _bond_disorder_indices(relative_index_from, orbitals_before_from, relative_index_to, orbitals_before_to,
+                           hoppings, powers, cell_stride):
+    """Unique orbital indices of the bonds defined by the matrix of hoppings, where each bond is followed by its complex
+    conjugate.
+
+    Parameters
+    ----------
+    relative_index_from, relative_index_to : array_like
+        Relative index of the unit cell the bond goes from and to.
+    orbitals_before_from, orbitals_before_to : int
+        Number of orbitals before the sublattice the bond goes from and to.
+    hoppings : np.ndarray
+        2D hopping matrix, element (i, j) is the bond from the i-th orbital to the j-th orbital of the sublattices.
+    powers : np.ndarray
+        Powers of 3 used to uniquely identify the relative unit cell, of the size of the space dimension.
+    cell_stride : int
+        Stride between the orbitals of the unit cell, 3 ** space dimension.
+    """
+    relative_move_from = np.dot(np.asarray(relative_index_from) + 1, powers)
+    relative_move_to = np.dot(np.asarray(relative_index_to) + 1, powers)
+
+    num_from, num_to = hoppings.shape
+    orb_from = relative_move_from + (orbitals_before_from + np.arange(num_from)) * cell_stride
+    orb_to = relative_move_to + (orbitals_before_to + np.arange(num_to)) * cell_stride
+    orb_from = np.repeat(orb_from, num_to)
+    orb_to = np.tile(orb_to, num_from)
+
+    orbital_from = np.empty(2 * hoppings.size, dtype=np.int64)
+    orbital_to = np.empty(2 * hoppings.size, dtype=np.int64)
+    orbital_from[0::2] = orb_from
+    orbital_from[1::2] = orb_to
+    orbital_to[0::2] = orb_to
+    orbital_to[1::2] = orb_from
+    hops_flat = hoppings.ravel()
+    orbital_hop = np.empty(2 * hops_flat.size, dtype=hops_flat.dtype)
+    orbital_hop[0::2] = hops_flat
+    orbital_hop[1::2] = np.conj(hops_flat)
+
+    return orbital_from, orbital_to, orbital_hop
+
+
+def _enumerate_hoppings(relative_moves, from_ids, to_ids, energies, orbitals_before, cell_stride):
+    """Orbital indices and values of all the elements of the hopping matrices, enumerated in a single vectorized pass.
+
+    Parameters
+    ----------
+    relative_moves : np.ndarray
+        Identifier of the relative unit cell of each hopping term, (relative index + 1) x powers of 3.
+    from_ids, to_ids : np.ndarray
+        Sublattice each hopping term goes from and to.
+    energies : list
+        2D hopping matrix of each term, element (i, j) is the hopping from the i-th orbital to the j-th orbital of the
+        sublattices.
+    orbitals_before : np.ndarray
+        Number of orbitals before each of the sublattices.
+    cell_stride : int
+        Stride between the orbitals of the unit cell, 3 ** space dimension.
+    """
+    energies = [np.asarray(energy) for energy in energies]
+    sizes = np.array([energy.size for energy in energies], dtype=np.int64)
+    num_cols = np.array([energy.shape[1] for energy in energies], dtype=np.int64)
+    offsets = np.cumsum(sizes) - sizes
+
+    # term of each matrix element, and its position (i, j) inside the hopping matrix of the term
+    term = np.repeat(np.arange(sizes.size), sizes)
+    local = np.arange(np.sum(sizes)) - offsets[term]
+    idx_from, idx_to = np.divmod(local, num_cols[term])
+
+    orbital_from = orbitals_before[from_ids][term] + idx_from
+    orbital_to = relative_moves[term] + (orbitals_before[to_ids][term] + idx_to) * cell_stride
+    # values are written into a single preallocated buffer at the offset of each term
+    # common dtype of the distinct dtypes only, result_type takes a limited number of arguments on older NumPy
+    orbital_hop = np.empty(local.size, dtype=np.result_type(*{energy.dtype for energy in energies}))
+    for energy, offset in zip(energies, offsets):
+        orbital_hop[offset:offset + energy.size] = energy.ravel()
+
+    return orbital_from, orbital_to, orbital_hop
+
+
+def _nonlinear_direction_id(direction):
+    """Identifier of the direction of the nonlinear optical conductivity in the C++ code, where the characters x, y and
+    z are the digits 0, 1 and 2 of a number in base 3. Returns None if the direction is not valid."""
+    if not isinstance(direction, str) or len(direction) != 3 or not all(c in 'xyz' for c in direction):
+        return None
+    return (ord(direction[0]) - ord('x')) * 9 + (ord(direction[1]) - ord('x')) * 3 + (ord(direction[2]) - ord('x'))
+
+
 # Class that introduces Structural Disorder into the initially built lattice.
 # The exported dataset StructuralDisorder has the following groups:
 # - Concentration: concentration of disorder,
-# - NumBondDisorder: number of bond changes,
-# - NumOnsiteDisorder: number of onsite energy,
+# - NumBondDisorder: number of bond changes, counting each orbital pair and its conjugate,
+# - NumOnsiteDisorder: number of onsite energy, counting each orbital,
 # The disorder is represented through nodes, where each node represents and maps a single orbital.
 # - NumNodes: total number of orbitals included in the disorded,
 # - NodePosition: orbital associated with the node,
@@ -40,17 +185,21 @@ class StructuralDisorder:
         self._num_bond_disorder_per_type = 0
         self._num_onsite_disorder_per_type = 0
 
-        self._orbital_from = []
-        self._orbital_to = []
-        self._orbital_onsite = []
+        # bond and onsite disorder entries of all the terms in flat arrays, where the entries of the i-th term are
+        # [ptr[i], ptr[i + 1]) of the flat arrays
+        self._bond_ptr = [0]
+        self._orb_from_flat = np.zeros(0, dtype=np.int64)
+        self._orb_to_flat = np.zeros(0, dtype=np.int64)
+        self._hop_flat = np.zeros(0)
+        self._onsite_ptr = [0]
+        self._orb_onsite_flat = np.zeros(0, dtype=np.int64)
+        self._onsite_flat = np.zeros(0)
 
         self._idx_node = 0
-        self._disorder_hopping = []
-        self._disorder_onsite = []
 
-        self._nodes_from = []
-        self._nodes_to = []
-        self._nodes_onsite = []
+        self._nodes_from_flat = np.zeros(0, dtype=np.int64)
+        self._nodes_to_flat = np.zeros(0, dtype=np.int64)
+        self._nodes_onsite_flat = np.zeros(0, dtype=np.int64)
 
         # only used for scaling
         self._sub_from = []
@@ -68,7 +217,7 @@ class StructuralDisorder:
         self._num_nodes = 0
         self._nodes_map = dict()
         self._node_orbital = []
-        num_orbitals = np.zeros(lattice.nsub, dtype=np.uint64)
+        num_orbitals = np.zeros(lattice.nsub, dtype=np.int64)
         for name, sub in lattice.sublattices.items():
             # num of orbitals at each sublattice is equal to size of onsite energy
             num_energies = np.asarray(sub.energy).shape[0]
@@ -78,6 +227,68 @@ class StructuralDisorder:
         self._num_orbitals_before = np.cumsum(np.asarray(num_orbitals)) - num_orbitals
         self._lattice = lattice
 
+        # lattice info reused by every added disorder term
+        self._space_size = np.asarray(lattice.vectors).shape[0]
+        self._powers = 3 ** np.arange(self._space_size, dtype=np.int64)
+        self._cell_stride = np.int64(3) ** self._space_size
+        self._sub_names = tuple(lattice.sublattices.keys())
+        self._sub_list = tuple(lattice.sublattices.values())
+        self._name_to_idx = {name: idx for idx, name in enumerate(self._sub_names)}
+        # alias id, number of orbitals and number of orbitals before each sublattice, rows follow self._sub_names
+        self._sub_meta = np.array([(sub.alias_id, self._num_orbitals[sub.alias_id],
+                                    self._num_orbitals_before[sub.alias_id]) for sub in self._sub_list],
+                                  dtype=[('id', np.int32), ('num_orb', np.int64), ('orb_before', np.int64)])
+
+        # spatial index of the sites in the neighbouring unit cells, built on first use by candidate_bonds
+        self._kdtree = None
+        self._kdtree_positions = None
+        self._kdtree_cells = None
+        self._kdtree_subs = None
+
+    def candidate_bonds(self, cutoff):
+        """Find all the bonds between the sites of the unit cell [0, 0] and the sites of the neighbouring unit cells
+        that are shorter than the cutoff.
+
+        Parameters
+        ----------
+        cutoff : float
+            Maximum length of the bond.
+
+        Returns
+        -------
+        list of tuples ([rel. unit cell from], sublattice_from, [rel. unit cell to], sublattice_to), which need only a
+        value of the hopping to be added with add_structural_disorder. Each bond is listed once, in a single direction,
+        as its conjugate is added together with it.
+        """
+        space_size = self._space_size
+
+        if self._kdtree is None:
+            positions = np.array([sub.position[0:space_size] for sub in self._sub_list])
+            vectors = np.asarray(self._lattice.vectors)[:, 0:space_size]
+            # only the next nearest unit cells are supported in the bond disorder
+            cells = np.array(list(itertools.product((-1, 0, 1), repeat=space_size)))
+            sites = np.dot(cells, vectors)[:, np.newaxis, :] + positions[np.newaxis, :, :]
+
+            self._kdtree_cells = np.repeat(cells, len(self._sub_list), axis=0)
+            self._kdtree_subs = np.tile(np.arange(len(self._sub_list)), cells.shape[0])
+            self._kdtree = cKDTree(sites.reshape(-1, space_size))
+            self._kdtree_positions = positions
+
+        home_cell = [0] * space_size
+        bonds = []
+        for idx_from, neighbours in enumerate(self._kdtree.query_ball_point(self._kdtree_positions, cutoff)):
+            for idx in sorted(neighbours):
+                idx_to = self._kdtree_subs[idx]
+                cell_to = self._kdtree_cells[idx].tolist()
+                # the bond from [0, 0] to [i, j] is the bond from [0, 0] to -[i, j] in the opposite direction, keep
+                # only the one where (unit cell, sublattice) of the target follows the source, which also skips the
+                # site itself
+                if (cell_to, idx_to) <= (home_cell, idx_from):
+                    continue
+                bonds.append((list(home_cell), self._sub_names[idx_from], cell_to, self._sub_names[idx_to]))
+
+        return bonds
+
     def add_vacancy(self, *disorder):
         if len(disorder) == 1:
             num_vacancy_disorder = 0
@@ -98,14 +309,21 @@ class StructuralDisorder:
 
         num_bond_disorder_per_type = 0
         num_onsite_disorder_per_type = 0
+        # orbitals of each added term in the order they were added, used for mapping the orbitals to nodes
+        bond_terms = []
+        term_orbitals = []
         for dis in disorder:
             if len(dis) == 5:
                 num_bond_disorder_per_type += 1
                 self.add_local_bond_disorder(*dis)
+                bond_terms.append(True)
+                term_orbitals.append(self._orb_from_flat[self._bond_ptr[-2]:])
             else:
                 if len(dis) == 3:
                     num_onsite_disorder_per_type += 1
                     self.add_local_onsite_disorder(*dis)
+                    bond_terms.append(False)
+                    term_orbitals.append(self._orb_onsite_flat[self._onsite_ptr[-2]:])
                 else:
                     raise SystemExit('Disorder should be added in a form of bond disorder:'
                                      '\n([rel. unit cell from], sublattice_from, [rel. unit cell to], sublattice_to, '
@@ -114,62 +332,113 @@ class StructuralDisorder:
                                      '\n ([rel. unit cell], sublattice_name, '
                                      'onsite energy)')
 
+        if term_orbitals:
+            self.map_the_orbitals(bond_terms, term_orbitals)
+
         self._num_bond_disorder_per_type = num_bond_disorder_per_type
         self._num_onsite_disorder_per_type = num_onsite_disorder_per_type
-        sorted_node_orb = sorted(self._nodes_map, key=lambda x: self._nodes_map[x])
-        sorted_nodes = [self._nodes_map[x] for x in sorted_node_orb]
+        # nodes are numbered sequentially as they are inserted, so the keys are already sorted by node
+        self._node_orbital = list(self._nodes_map)
 
-        sorted_dict = dict(zip(sorted_node_orb, sorted_nodes))
-        self._nodes_map = sorted_dict
-        self._node_orbital = sorted_node_orb
+    def add_bulk_onsite_disorder(self, relative_indices, sublattices, values):
+        """Add many onsite disorder terms at once, equivalent to add_structural_disorder with the terms
+        (relative_indices[i], sublattices[i], values[i]).
+
+        Parameters
+        ----------
+        relative_indices : array_like
+            Relative unit cells of the terms, one row per term.
+        sublattices : list of str
+            Sublattice names of the terms.
+        values : list
+            Onsite energies of the terms, a single value or one value per orbital of the sublattice.
+        """
+        num_terms = len(values)
+        if num_terms == 0:
+            return
+
+        # validate everything before any of the disorder lists is modified
+        relative_indices = np.atleast_2d(relative_indices)
+        if not relative_indices.shape[0] == len(sublattices) == num_terms:
+            raise SystemExit('Relative indices, sublattices and values should have the same length! ')
+        rows = []
+        for sub in sublattices:
+            if sub not in self._name_to_idx:
+                raise SystemExit('Desired initial sublattice doesnt exist in the chosen lattice! ')
+            rows.append(self._name_to_idx[sub])
+
+        values = [np.atleast_1d(value) for value in values]
+        sizes = np.array([value.size for value in values], dtype=np.int64)
+
+        # orbital indices of all the terms in one pass, the i-th orbital of each term is offset by i
+        term = np.repeat(np.arange(num_terms), sizes)
+        ends = np.cumsum(sizes)
+        local_orbital = np.arange(ends[-1]) - np.repeat(ends - sizes, sizes)
+        relative_move = np.dot(relative_indices + 1, self._powers)
+        orbitals = relative_move[term] + (self._sub_meta['orb_before'][rows][term] + local_orbital) * \
+            self._cell_stride
 
-    def map_the_orbital(self, orb, nodes_map):
-        idx_node = len(nodes_map)
-        if not (orb in nodes_map):
-            nodes_map[orb] = idx_node
-            idx_node += 1
-        self._nodes_map = nodes_map
+        self._nodes_map = dict()
+        for idx in range(num_terms):
+            # save the info used for manual scaling
+            self._sub_onsite.append(sublattices[idx])
+            self._rel_idx_onsite.append(relative_indices[idx])
+            self._onsite.append(values[idx])
 
-        return idx_node
+        self._orb_onsite_flat = np.concatenate((self._orb_onsite_flat, orbitals))
+        self._onsite_flat = np.concatenate([self._onsite_flat] + values)
+        self._onsite_ptr.extend((self._onsite_ptr[-1] + ends).tolist())
 
-    def add_local_vacancy_disorder(self, sub):
-        orbital_vacancy = []
+        self.map_the_orbitals([False] * num_terms, np.split(orbitals, ends[:-1]))
 
-        names, sublattices = zip(*self._lattice.sublattices.items())
+        self._num_bond_disorder_per_type = 0
+        self._num_onsite_disorder_per_type = num_terms
+        self._node_orbital = list(self._nodes_map)
+
+    def map_the_orbitals(self, bond_terms, term_orbitals):
+        # nodes are numbered in order of the first appearance of their orbital
+        orbitals = np.concatenate(term_orbitals)
+        unique_orb, first, inverse = np.unique(orbitals, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty(unique_orb.size, dtype=np.int64)
+        rank[order] = np.arange(unique_orb.size)
+        nodes = rank[inverse.ravel()]
+
+        bond_entries = np.repeat(bond_terms, [orb.size for orb in term_orbitals])
+        # bonds and their conjugates are stored in pairs, node to is node from of the conjugate
+        nodes_from = nodes[bond_entries]
+        self._nodes_from_flat = np.concatenate((self._nodes_from_flat, nodes_from))
+        self._nodes_to_flat = np.concatenate((self._nodes_to_flat, nodes_from.reshape(-1, 2)[:, ::-1].ravel()))
+        self._nodes_onsite_flat = np.concatenate((self._nodes_onsite_flat, nodes[~bond_entries]))
+
+        self._nodes_map = dict(zip(unique_orb[order].tolist(), range(unique_orb.size)))
+        if unique_orb.size > self._num_nodes:
+            self._num_nodes = unique_orb.size
 
-        if sub not in names:
+    def add_local_vacancy_disorder(self, sub):
+        if sub not in self._name_to_idx:
             raise SystemExit('Desired initial sublattice doesn\'t exist in the chosen lattice! ')
 
-        indx = names.index(sub)
-        lattice_sub = sublattices[indx]
+        sub_meta = self._sub_meta[self._name_to_idx[sub]]
 
-        sub_id = lattice_sub.alias_id
-
-        it = np.nditer(lattice_sub.energy, flags=['multi_index'])
-        while not it.finished:
-            orbit = self._num_orbitals_before[sub_id] + it.multi_index[0]
-            if orbit not in orbital_vacancy:
-                orbital_vacancy.append(orbit)
-            it.iternext()
+        # all the orbitals of the vacant sublattice
+        orbital_vacancy = sub_meta['orb_before'] + np.arange(sub_meta['num_orb'])
 
         self._orbital_vacancy.append(orbital_vacancy)
         self._vacancy_sub.append(sub)
 
     def add_local_bond_disorder(self, relative_index_from, from_sub, relative_index_to, to_sub, hoppings):
+        # a single value is a bond between single orbital sublattices
+        hoppings = np.atleast_2d(hoppings)
 
         # save the info used for manual scaling
         self._sub_from.append(from_sub)
         self._sub_to.append(to_sub)
         self._rel_idx_to.append(relative_index_to)
         self._rel_idx_from.append(relative_index_from)
-        self._hopping.append(np.atleast_1d(hoppings))
-
-        orbital_from = []
-        orbital_to = []
-        orbital_hop = []
+        self._hopping.append(hoppings)
 
-        vectors = np.asarray(self._lattice.vectors)
-        space_size = vectors.shape[0]
+        space_size = self._space_size
 
         distance_relative = np.asarray(relative_index_from) - np.asarray(relative_index_to)
 
@@ -177,154 +446,43 @@ class StructuralDisorder:
             raise SystemExit('Currently only the next nearest distances are supported, make the bond of the bond '
                              'disorder shorter! ')
 
-        names, sublattices = zip(*self._lattice.sublattices.items())
-
-        if from_sub not in names:
+        if from_sub not in self._name_to_idx:
             raise SystemExit('Desired initial sublattice doesnt exist in the chosen lattice! ')
-        if to_sub not in names:
+        if to_sub not in self._name_to_idx:
             raise SystemExit('Desired final sublattice doesnt exist in the chosen lattice! ')
 
-        indx_from = names.index(from_sub)
-        lattice_sub_from = sublattices[indx_from]
-
-        indx_to = names.index(to_sub)
-        lattice_sub_to = sublattices[indx_to]
-
-        from_sub_id = lattice_sub_from.alias_id
-        to_sub_id = lattice_sub_to.alias_id
+        sub_meta_from = self._sub_meta[self._name_to_idx[from_sub]]
+        sub_meta_to = self._sub_meta[self._name_to_idx[to_sub]]
 
-        nodes_map = self._nodes_map
+        orbital_from, orbital_to, orbital_hop = _bond_disorder_indices(
+            relative_index_from, sub_meta_from['orb_before'],
+            relative_index_to, sub_meta_to['orb_before'], hoppings, self._powers, self._cell_stride)
 
-        nodes_from = []
-        nodes_to = []
-
-        h = np.nditer(hoppings, flags=['multi_index'])
-        while not h.finished:
-            relative_move_from = np.dot(np.asarray(relative_index_from) + 1,
-                                        3 ** np.linspace(0, space_size - 1, space_size, dtype=np.int32))
-            relative_move_to = np.dot(np.asarray(relative_index_to) + 1,
-                                      3 ** np.linspace(0, space_size - 1, space_size, dtype=np.int32))
-
-            if isinstance(hoppings, np.ndarray):
-                orb_from = int(relative_move_from +
-                               (self._num_orbitals_before[from_sub_id] + h.multi_index[0]) * 3 ** space_size)
-                orb_to = int(relative_move_to +
-                             (self._num_orbitals_before[to_sub_id] + h.multi_index[1]) * 3 ** space_size)
-
-                self.map_the_orbital(orb_from, nodes_map)
-                self.map_the_orbital(orb_to, nodes_map)
-
-                orbital_from.append(orb_from)
-                orbital_to.append(orb_to)
-
-                nodes_from.append(nodes_map[orb_from])
-                nodes_to.append(nodes_map[orb_to])
-
-                # conjugate
-                orbital_from.append(orb_to)
-                orbital_to.append(orb_from)
-
-                nodes_from.append(nodes_map[orb_to])
-                nodes_to.append(nodes_map[orb_from])
-
-                orbital_hop.append(h[0])
-                orbital_hop.append(np.conj(h[0]))
-
-            else:
-                orb_from = int(relative_move_from + self._num_orbitals_before[from_sub_id] * 3 ** space_size)
-                orb_to = int(relative_move_to + self._num_orbitals_before[to_sub_id] * 3 ** space_size)
-
-                self.map_the_orbital(orb_from, nodes_map)
-                self.map_the_orbital(orb_to, nodes_map)
-
-                orbital_from.append(orb_from)
-                orbital_to.append(orb_to)
-
-                nodes_from.append(nodes_map[orb_from])
-                nodes_to.append(nodes_map[orb_to])
-
-                # conjugate
-                orbital_from.append(orb_to)
-                orbital_to.append(orb_from)
-
-                nodes_from.append(nodes_map[orb_to])
-                nodes_to.append(nodes_map[orb_from])
-
-                orbital_hop.append(h[0])
-                orbital_hop.append((h[0].conjugate()))
-
-            h.iternext()
-
-        self._orbital_from.append(orbital_from)
-        self._orbital_to.append(orbital_to)
-
-        self._disorder_hopping.append(orbital_hop)
-
-        self._nodes_from.append(nodes_from)
-        self._nodes_to.append(nodes_to)
-
-        if len(nodes_map) > self._num_nodes:
-            self._num_nodes = len(nodes_map)
+        self._orb_from_flat = np.concatenate((self._orb_from_flat, orbital_from))
+        self._orb_to_flat = np.concatenate((self._orb_to_flat, orbital_to))
+        self._hop_flat = np.concatenate((self._hop_flat, orbital_hop))
+        self._bond_ptr.append(self._bond_ptr[-1] + orbital_hop.size)
 
     def add_local_onsite_disorder(self, relative_index, sub, value):
+        value = np.atleast_1d(value)
 
         # save the info used for manual scaling
         self._sub_onsite.append(sub)
         self._rel_idx_onsite.append(relative_index)
-        self._onsite.append(np.atleast_1d(value))
-
-        orbital_onsite = []
-        orbital_onsite_en = []
-
-        nodes_map = self._nodes_map
-
-        vectors = np.asarray(self._lattice.vectors)
-        space_size = vectors.shape[0]
-
-        names, sublattices = zip(*self._lattice.sublattices.items())
+        self._onsite.append(value)
 
-        if sub not in names:
+        if sub not in self._name_to_idx:
             raise SystemExit('Desired initial sublattice doesnt exist in the chosen lattice! ')
 
-        indx_sub = names.index(sub)
-        lattice_sub = sublattices[indx_sub]
-
-        sub_id = lattice_sub.alias_id
-
-        nodes_onsite = []
-
-        h = np.nditer(value, flags=['multi_index'])
-        while not h.finished:
-            relative_move = np.dot(np.asarray(relative_index) + 1,
-                                   3 ** np.linspace(0, space_size - 1, space_size, dtype=np.int32))
-
-            if isinstance(value, np.ndarray):
-                orb = int(relative_move + (self._num_orbitals_before[sub_id] + h.multi_index[0]) * 3 ** space_size)
-
-                self.map_the_orbital(orb, nodes_map)
+        sub_meta = self._sub_meta[self._name_to_idx[sub]]
 
-                orbital_onsite_en.append(h[0])
+        relative_move = np.dot(np.asarray(relative_index) + 1, self._powers)
 
-                nodes_onsite.append(nodes_map[orb])
-                orbital_onsite.append(orb)
-            else:
-                orb = int(relative_move + self._num_orbitals_before[sub_id] * 3 ** space_size)
-
-                self.map_the_orbital(orb, nodes_map)
-
-                orbital_onsite_en.append(h[0])
-                nodes_onsite.append(nodes_map[orb])
-                orbital_onsite.append(orb)
-            h.iternext()
-
-        self._orbital_onsite.append(orbital_onsite)
-
-        self._disorder_onsite.append(orbital_onsite_en)
-
-        self._nodes_onsite.append(nodes_onsite)
+        orbital_onsite = relative_move + (sub_meta['orb_before'] + np.arange(value.size)) * self._cell_stride
 
-        if len(nodes_map) > self._num_nodes:
-            self._num_nodes = len(nodes_map)
+        self._orb_onsite_flat = np.concatenate((self._orb_onsite_flat, orbital_onsite))
+        self._onsite_flat = np.concatenate((self._onsite_flat, value))
+        self._onsite_ptr.append(self._onsite_ptr[-1] + value.size)
 
 
 # Class that introduces Disorder into the initially built lattice.
@@ -347,7 +505,7 @@ class Disorder:
         # sublattice that has the chosen disorder.
         self._sub_name = []
 
-        num_orbitals = np.zeros(lattice.nsub, dtype=np.uint64)
+        num_orbitals = np.zeros(lattice.nsub, dtype=np.int64)
         for name, sub in lattice.sublattices.items():
             # num of orbitals at each sublattice is equal to size of onsite energy
             num_energies = np.asarray(sub.energy).shape[0]
@@ -357,6 +515,15 @@ class Disorder:
         self._num_orbitals_before = np.cumsum(np.asarray(num_orbitals)) - num_orbitals
         self._lattice = lattice
 
+        # lattice info reused by every added disorder term
+        self._sub_names = tuple(lattice.sublattices.keys())
+        self._sub_list = tuple(lattice.sublattices.values())
+        self._name_to_idx = {name: idx for idx, name in enumerate(self._sub_names)}
+        # alias id, number of orbitals and number of orbitals before each sublattice, rows follow self._sub_names
+        self._sub_meta = np.array([(sub.alias_id, self._num_orbitals[sub.alias_id],
+                                    self._num_orbitals_before[sub.alias_id]) for sub in self._sub_list],
+                                  dtype=[('id', np.int32), ('num_orb', np.int64), ('orb_before', np.int64)])
+
     # class method that introduces the disorder to the lattice
     def add_disorder(self, sublattice, dis_type, mean_value, standard_deviation=0.):
         if isinstance(dis_type, list):
@@ -371,68 +538,45 @@ class Disorder:
 
     def add_local_disorder(self, sublattice_name, dis_type, mean_value, standard_deviation):
 
-        vectors = np.asarray(self._lattice.vectors)
-        space_size = vectors.shape[0]
-
-        names, sublattices = zip(*self._lattice.sublattices.items())
-
-        if sublattice_name not in names:
+        if sublattice_name not in self._name_to_idx:
             raise SystemExit('Desired sublattice doesnt exist in the chosen lattice! ')
-        indx = names.index(sublattice_name)
-        lattice_sub = sublattices[indx]
-        size_orb = self._num_orbitals[lattice_sub.alias_id]
-
-        hopping = {'relative_index': np.zeros(space_size, dtype=np.int32), 'from_id': lattice_sub.alias_id,
-                   'to_id': lattice_sub.alias_id, 'mean_value': lattice_sub.energy}
-
-        # number of orbitals before i-th sublattice, where is is the array index
-        orbitals_before = self._num_orbitals_before
-
-        orbital_from = self._orbital
-        orbital_to = []
-        orbital_dis_mean = self._mean
-        orbital_dis_stdv = self._stdv
-        orbital_dis_type = self._type
-        orbital_dis_type_id = self._type_id
-
-        dis_number = {'Gaussian': 1, 'Uniform': 2, 'Deterministic': 3, 'gaussian': 1, 'uniform': 2, 'deterministic': 3}
-        for index, it in enumerate(mean_value):
-            relative_move = np.dot(hopping['relative_index'] + 1,
-                                   3 ** np.linspace(0, space_size - 1, space_size, dtype=np.int32))
-            if len(mean_value) > 1:
-                orbital_from.append(orbitals_before[hopping['from_id']] + index)
-                orbital_to.append(relative_move + (orbitals_before[hopping['to_id']] + index) * 3 ** space_size)
-            else:
-                orbital_from.append(hopping['from_id'])
-                orbital_to.append(relative_move + hopping['to_id'] * 3 ** space_size)
-            orbital_dis_mean.append(it)
-            orbital_dis_stdv.append(standard_deviation[index])
-            orbital_dis_type.append(dis_type[index])
-            if dis_type[index] in dis_number:
-                orbital_dis_type_id.append(dis_number[dis_type[index]])
-                if dis_type[index] == 'Deterministic' or dis_type[index] == 'deterministic':
-                    if standard_deviation[index] != 0:
-                        raise SystemExit(
-                            'Standard deviation of deterministic disorder must be 0.')
-            else:
-                raise SystemExit(
-                    'Disorder not present! Try between Gaussian, Deterministic, and Uniform case insensitive ')
+        sub_meta = self._sub_meta[self._name_to_idx[sublattice_name]]
+        size_orb = sub_meta['num_orb']
 
-        if not (all(np.asarray(i).shape == size_orb for i in [dis_type, mean_value, standard_deviation])):
+        # validate everything before any of the disorder lists is modified
+        if not (all(np.asarray(i).shape == (size_orb,) for i in [dis_type, mean_value, standard_deviation])):
             print('Shape of disorder', len(dis_type), len(mean_value), len(standard_deviation),
                   'is different than the number of orbitals at sublattice ', sublattice_name, 'which is', size_orb,
                   '\n')
             raise SystemExit('All parameters should have the same length! ')
 
-        self._sub_name.append(sublattice_name * len(mean_value))
-        self._type = orbital_dis_type
-        self._type_id = orbital_dis_type_id
-        self._mean = orbital_dis_mean
-        self._stdv = orbital_dis_stdv
-        self._orbital = orbital_from
+        # type_id of the disorder, 'Gaussian': 1, 'Uniform': 2 and 'Deterministic': 3, 0 if not valid
+        dis_type_lower = np.char.lower(np.asarray(dis_type, dtype=str))
+        type_id = np.where(dis_type_lower == 'gaussian', 1,
+                           np.where(dis_type_lower == 'uniform', 2,
+                                    np.where(dis_type_lower == 'deterministic', 3, 0))).astype(np.int32)
+        if np.any(type_id == 0):
+            raise SystemExit(
+                'Disorder not present! Try between Gaussian, Deterministic, and Uniform case insensitive ')
+        if np.any((type_id == 3) & (np.asarray(standard_deviation) != 0)):
+            raise SystemExit(
+                'Standard deviation of deterministic disorder must be 0.')
+
+        # orbitals of the sublattice are numbered after all the orbitals of the preceding sublattices
+        orbital_from = sub_meta['orb_before'] + np.arange(size_orb)
+
+        self._orbital.extend(orbital_from.tolist())
+        self._mean.extend(mean_value)
+        self._stdv.extend(standard_deviation)
+        self._type.extend(dis_type)
+        self._type_id.extend(type_id.tolist())
+        self._sub_name.extend([sublattice_name] * len(mean_value))
 
 
 class Calculation:
+    # available directions and their identifiers in the C++ code, shared by all the instances
+    _avail_dir_full = {'xx': 0, 'yy': 1, 'zz': 2, 'xy': 3, 'xz': 4, 'yx': 5, 'yz': 6, 'zx': 7, 'zy': 8}
+    _avail_dir_sngl = {'xx': 0, 'yy': 1, 'zz': 2}
 
     @property
     def get_dos(self):
@@ -472,13 +616,6 @@ class Calculation:
         self._conductivity_optical_nonlinear = []
         self._singleshot_conductivity_dc = []
 
-        self._avail_dir_full = {'xx': 0, 'yy': 1, 'zz': 2, 'xy': 3, 'xz': 4, 'yx': 5, 'yz': 6, 'zx': 7, 'zy': 8}
-        self._avail_dir_nonl = {'xxx': 0, 'xxy': 1, 'xxz': 2, 'xyx': 3, 'xyy': 4, 'xyz': 5, 'xzx': 6, 'xzy': 7,
-                                'xzz': 8, 'yxx': 9, 'yxy': 10, 'yxz': 11, 'yyx': 12, 'yyy': 13, 'yyz': 14, 'yzx': 15,
-                                'yzy': 16, 'yzz': 17, 'zxx': 18, 'zxy': 19, 'zxz': 20, 'zyx': 21, 'zyy': 22, 'zyz': 23,
-                                'zzx': 24, 'zzy': 25, 'zzz': 26}
-        self._avail_dir_sngl = {'xx': 0, 'yy': 1, 'zz': 2}
-
     def dos(self, num_points, num_moments, num_random, num_disorder=1):
         """Calculate the density of states as a function of energy
 
@@ -578,15 +715,16 @@ class Calculation:
             Optional parameters, forward special, a parameter that can simplify the calculation for some materials.
         """
 
-        if direction not in self._avail_dir_nonl:
+        direction_id = _nonlinear_direction_id(direction)
+        if direction_id is None:
             print('The desired direction is not available. Choose from a following set: \n',
-                  self._avail_dir_nonl.keys())
+                  [''.join(d) for d in itertools.product('xyz', repeat=3)])
             raise SystemExit('Invalid direction!')
         else:
             special = kwargs.get('special', 0)
 
             self._conductivity_optical_nonlinear.append(
-                {'direction': self._avail_dir_nonl[direction], 'num_points': num_points,
+                {'direction': direction_id, 'num_points': num_points,
                  'num_moments': num_moments, 'num_random': num_random, 'num_disorder': num_disorder,
                  'temperature': temperature, 'special': special})
 
@@ -626,10 +764,17 @@ class Calculation:
                  'preserve_disorder': np.atleast_1d(preserve_disorder)})
 
 
+# type of the Hamiltonian for (is_complex, precision)
+_HTYPE_TABLE = {(0, 0): np.float32, (0, 1): np.float64, (0, 2): np.longdouble,
+                (1, 0): np.complex64, (1, 1): np.complex128, (1, 2): np.clongdouble}
+
+
 class Configuration:
+    # number of rows in a chunk of the compressed datasets
+    h5_chunk = 4096
 
     def __init__(self, divisions=(1, 1), length=(1, 1), boundaries=(False, False), is_complex=False, precision=1,
-                 spectrum_range=None):
+                 spectrum_range=None, h5_compression=None):
         """Define basic parameters used in the calculation
 
        Parameters
@@ -644,13 +789,22 @@ class Configuration:
            Boolean that reflects whether the type of Hamiltonian is complex or not.
        precision : int
             Integer which defines the precision of the number used in the calculation. Float - 0, double - 1,
-            long double - 2.
+            long double - 2. Float is the narrowest storage supported by the C++ code and halves the memory traffic of
+            the Hamiltonian compared to double.
        spectrum_range : Optional[Tuple[float, float]]
             Energy scale which defines the scaling factor of all the energy related parameters. The scaling is done
             automatically in the background after this definition. If the term is not specified, a rough estimate of the
             bounds is found.
+       h5_compression : Optional[str]
+            Compression filter of the large datasets (Hamiltonian and disorder arrays) in the exported *.h5 file, 'gzip'
+            or None. The filter has to be available in the HDF5 library used by the C++ code, which is why the h5py
+            only filter 'lzf' is not supported.
        """
 
+        if h5_compression not in (None, 'gzip'):
+            raise SystemExit('Compression of the exported datasets should be None or \'gzip\'')
+        self._h5_compression = h5_compression
+
         if spectrum_range:
             self._energy_scale = (spectrum_range[1] - spectrum_range[0]) / 2
             self._energy_shift = (spectrum_range[1] + spectrum_range[0]) / 2
@@ -668,22 +822,9 @@ class Configuration:
         self.set_type()
 
     def set_type(self, ):
-        if self._is_complex == 0:
-            if self._precision == 0:
-                self._htype = np.float32
-            elif self._precision == 1:
-                self._htype = np.float64
-            elif self._precision == 2:
-                self._htype = np.float128
-            else:
-                raise SystemExit('Precision should be 0, 1 or 2')
-        else:
-            if self._precision == 0:
-                self._htype = np.complex64
-            elif self._precision == 1:
-                self._htype = np.complex128
-            elif self._precision == 2:
-                self._htype = np.complex256
+        if self._precision not in (0, 1, 2):
+            raise SystemExit('Precision should be 0, 1 or 2')
+        self._htype = _HTYPE_TABLE[(self._is_complex, self._precision)]
 
     @property
     def energy_scale(self):
@@ -726,6 +867,19 @@ class Configuration:
         """Return the type of the Hamiltonian complex or real, and float, double or long double. """
         return self._htype
 
+    @property
+    def h5_compression(self):
+        """Return the compression filter of the large exported datasets, None if they are not compressed. """
+        return self._h5_compression
+
+    def h5_options(self, shape):
+        """Return the create_dataset arguments for a large dataset of the given shape, chunked along the first axis
+        when compression is selected. """
+        shape = tuple(shape)
+        if not self._h5_compression or not shape or 0 in shape:
+            return {}
+        return {'chunks': (min(self.h5_chunk, shape[0]),) + shape[1:], 'compression': self._h5_compression}
+
 
 def make_pybinding_model(lattice, disorder=None, disorder_structural=None, **kwargs):
     """Build a Pybinding model with disorder used in Kite. Bond disorder is not currently supported.
@@ -740,85 +894,59 @@ def make_pybinding_model(lattice, disorder=None, disorder_structural=None, **kwa
     disorder_structural : StructuralDisorder
         Class that introduces StructuralDisorder into the initially built lattice. For more info check the
         StructuralDisorder class.
-    **kwargs: Optional arguments like shape .
+    **kwargs: Optional arguments like shape and seed of the random number generator used for the disorder. The
+        disorder is drawn from its own generator, so it is not affected by np.random.seed.
 
     """
 
     shape = kwargs.get('shape', None)
-    if disorder_structural:
+    # a single generator is shared by all the disorder modifiers of the model
+    rng = np.random.default_rng(kwargs.get('seed', None))
+    sqrt3 = np.sqrt(3)
+    disorder_list = _aslist(disorder)
+    disorder_struc_list = _aslist(disorder_structural)
+    if disorder_struc_list:
         # check if there's a bond disorder term
         # return an error if so
-        disorder_struc_list = disorder_structural
-        if not isinstance(disorder_structural, list):
-            disorder_struc_list = [disorder_structural]
-
         for idx_struc, dis_struc in enumerate(disorder_struc_list):
             if len(dis_struc._sub_from):
                 raise SystemExit(
                     'Automatic scaling is not supported when bond disorder is specified. Please select the scaling '
                     'bounds manually.')
 
-    def gaussian_disorder(sub, mean_value, stdv):
-        """Add gaussian disorder with selected mean value and standard deviation to the pybinding model.
-
-        Parameters
-        ----------
-        sub : str
-            Select a sublattice where disorder should be added.
-        mean_value : float
-            Select a mean value of the disorder.
-        stdv : float
-            Select standard deviation of the disorder.
-        """
-
-        @pb.onsite_energy_modifier
-        def modify_energy(energy, sub_id):
-            rand_onsite = np.random.normal(loc=mean_value, scale=stdv, size=len(energy[sub_id == sub]))
-            energy[sub_id == sub] += rand_onsite
-            return energy
-
-        return modify_energy
-
-    def deterministic_disorder(sub, mean_value):
-        """Add deterministic disorder with selected mean value to the Pybinding model.
-
-        Parameters
-        ----------
-        sub : str
-            Select a sublattice where disorder should be added.
-        mean_value : float
-            Select a mean value of the disorder.
-
-        """
-
-        @pb.onsite_energy_modifier
-        def modify_energy(energy, sub_id):
-            onsite = mean_value * np.ones(len(energy[sub_id == sub]))
-            energy[sub_id == sub] += onsite
-            return energy
-
-        return modify_energy
-
-    def uniform_disorder(sub, mean_value, stdv):
-        """Add uniform disorder with selected mean value and standard deviation to the Pybinding model.
+    def onsite_disorder(sub_names, dis_types, mean_values, stdvs):
+        """Add all the onsite disorder terms to the Pybinding model as a single modifier.
 
         Parameters
         ----------
-        sub : str
-            Select a sublattice where disorder should be added.
-        mean_value : float
-            Select a mean value of the disorder.
-        stdv : float
-            Select standard deviation of the disorder.
+        sub_names : list
+            Sublattice where each of the disorder terms should be added.
+        dis_types : list
+            Type of each of the disorder terms, 'uniform', 'gaussian' or 'deterministic'.
+        mean_values : list
+            Mean value of each of the disorder terms.
+        stdvs : list
+            Standard deviation of each of the disorder terms, not used for the deterministic disorder.
         """
 
         @pb.onsite_energy_modifier
         def modify_energy(energy, sub_id):
-            a = mean_value - stdv * np.sqrt(3)
-            b = mean_value + stdv * np.sqrt(3)
-
-            rand_onsite = np.random.uniform(low=a, high=b, size=len(energy[sub_id == sub]))
-            energy[sub_id == sub] += rand_onsite
+            # the mask of each sublattice is evaluated only once, no matter how many terms are added to it
+            masks = {}
+            for sub, dis_type, mean_value, stdv in zip(sub_names, dis_types, mean_values, stdvs):
+                if sub not in masks:
+                    masks[sub] = sub_id == sub
+                select = masks[sub]
+                size = np.count_nonzero(select)
+
+                if dis_type == 'uniform':
+                    a = mean_value - stdv * sqrt3
+                    b = mean_value + stdv * sqrt3
+                    energy[select] += rng.uniform(a, b, size)
+                elif dis_type == 'gaussian':
+                    energy[select] += rng.normal(mean_value, stdv, size)
+                elif dis_type == 'deterministic':
+                    energy[select] += mean_value
 
             return energy
 
@@ -837,10 +965,11 @@ def make_pybinding_model(lattice, disorder=None, disorder_structural=None, **kwa
 
         @pb.site_state_modifier(min_neighbors=2)
         def modifier(state, sub_id):
-            rand_vec = np.random.rand(len(state))
-            vacant_sublattice = np.logical_and(sub_id == sub, rand_vec < concentration)
+            # random numbers are drawn only for the sites of the selected sublattice
+            sub_sites = np.flatnonzero(sub_id == sub)
+            vacant_sites = sub_sites[rng.random(sub_sites.size) < concentration]
 
-            state[vacant_sublattice] = False
+            state[vacant_sites] = False
             return state
 
         return modifier
@@ -855,22 +984,21 @@ def make_pybinding_model(lattice, disorder=None, disorder_structural=None, **kwa
         value : np.ndarray
             Value of the disordered onsite term.
         """
-        space_size = np.array(positions).shape[1]
+        # the disordered positions don't change between the calls of the modifier, build their tree only once
+        kdtree = cKDTree(positions, balanced_tree=False, compact_nodes=False)
+        space_size = kdtree.m
+        d_max = 0.05
 
         @pb.onsite_energy_modifier
         def modify_energy(x, y, z, energy):
-            # all_positions = np.column_stack((x, y, z))[0:space_size, :]
-            all_positions = np.stack([x, y, z], axis=1)[:, 0:space_size]
+            # only the coordinates within the space dimension are stacked
+            all_positions = np.column_stack((x, y, z)[0:space_size])
 
-            kdtree1 = cKDTree(positions)
-            kdtree2 = cKDTree(all_positions)
+            # find the closest disordered position for each site, with d < d_max. Selects the desired elements from
+            # the parameters x, y, z being used inside the modifier function.
+            dist, _ = kdtree.query(all_positions, k=1, distance_upper_bound=d_max)
 
-            d_max = 0.05
-            # find the closest elements between two trees, with d < d_max. Finds the desired elements from the
-            # parameters x, y, z being used inside the modifier function.
-            coo = kdtree1.sparse_distance_matrix(kdtree2, d_max, output_type='coo_matrix')
-
-            energy[coo.col] += value
+            energy[np.isfinite(dist)] += value
 
             return energy
 
@@ -883,7 +1011,9 @@ def make_pybinding_model(lattice, disorder=None, disorder_structural=None, **kwa
         norm_a2 = np.linalg.norm(a2)
         num_a1 = referent_size / norm_a1
         num_a2 = referent_size / norm_a2
-        shape = pb.rectangle(4 * num_a1 * norm_a1, 4 * num_a2 * norm_a2)
+        # the shape only has to cover a single period of the translational symmetry, which is given by the counts
+        # of unit cells instead of a polygon
+        shape = pb.primitive(a1=int(np.ceil(num_a1)), a2=int(np.ceil(num_a2)))
         trans_symm = pb.translational_symmetry(a1=num_a1 * norm_a1, a2=num_a2 * norm_a2)
         param = [shape, trans_symm]
     else:
@@ -891,58 +1021,49 @@ def make_pybinding_model(lattice, disorder=None, disorder_structural=None, **kwa
 
     model = pb.Model(lattice, *param)
 
-    if disorder:
-        disorder_list = disorder
-        if not isinstance(disorder, list):
-            disorder_list = [disorder]
+    if disorder_list:
+        sub_names, dis_types, mean_values, stdvs = [], [], [], []
         for dis in disorder_list:
-            for idx in range(len(dis._type)):
-                if dis._type[idx].lower() == 'uniform':
-                    model.add(
-                        uniform_disorder(dis._sub_name[idx], dis._mean[idx], dis._stdv[idx]))
-                if dis._type[idx].lower() == 'gaussian':
-                    model.add(
-                        gaussian_disorder(dis._sub_name[idx], dis._mean[idx], dis._stdv[idx]))
-                if dis._type[idx].lower() == 'deterministic':
-                    model.add(deterministic_disorder(dis._sub_name[idx], dis._mean[idx]))
-
-    if disorder_structural:
-
-        disorder_struc_list = disorder_structural
-        if not isinstance(disorder_structural, list):
-            disorder_struc_list = [disorder_structural]
+            sub_names.extend(dis._sub_name)
+            dis_types.extend(dis_type.lower() for dis_type in dis._type)
+            mean_values.extend(dis._mean)
+            stdvs.extend(dis._stdv)
+        model.add(onsite_disorder(sub_names, dis_types, mean_values, stdvs))
+
+    if disorder_struc_list:
+        space_size = np.array(lattice.vectors).shape[0]
+        vectors_T = np.asarray(lattice.vectors)[:, 0:space_size].T
+        names = list(model.lattice.sublattices.keys())
+        name_to_alias = {name: alias for alias, name in enumerate(names)}
 
         for idx_struc, dis_struc in enumerate(disorder_struc_list):
             num_sites = model.system.num_sites
-            rand_vec = np.random.rand(num_sites)
-            space_size = np.array(lattice.vectors).shape[0]
+            rand_vec = rng.random(num_sites)
 
             for vac in dis_struc._vacancy_sub:
                 model.add(vacancy_disorder(sub=vac, concentration=dis_struc._concentration))
 
-            for idx in range(len(dis_struc._sub_onsite)):
-                names, sublattices = zip(*model.lattice.sublattices.items())
+            # onsite modifiers don't change the sites, so the system can be read once for all the onsite terms
+            system_sublattices = model.system.sublattices
+            all_pos = np.stack([model.system.positions.x,
+                                model.system.positions.y,
+                                model.system.positions.z], axis=1)[:, 0:space_size]
 
-                sublattice_alias = names.index(dis_struc._sub_onsite[idx])
+            for idx in range(len(dis_struc._sub_onsite)):
+                sublattice_alias = name_to_alias[dis_struc._sub_onsite[idx]]
 
-                select_sublattice = model.system.sublattices == sublattice_alias
+                select_sublattice = system_sublattices == sublattice_alias
                 sub_and_rand = np.logical_and(select_sublattice, rand_vec < dis_struc._concentration)
 
                 # generates a set of random positions that will be added to the nodes in structural disorder, problem
                 # because when only one sublattice is selected, effective concentration will be lower
-                positions = np.stack([model.system.positions.x[sub_and_rand],
-                                      model.system.positions.y[sub_and_rand],
-                                      model.system.positions.z[sub_and_rand]], axis=1)[:, 0:space_size]
-
-                # ref_pos = np.stack([model.system.positions.x[def_site_idx], model.system.positions.y[def_site_idx],
-                #                     model.system.positions.z[def_site_idx]], axis=1)[:, 0:space_size]
+                positions = all_pos[sub_and_rand]
 
                 # get the position of onsite disordered sublattice
-                vectors = np.array(lattice.vectors)[:, 0:space_size]
                 pos_sub = lattice.sublattices[dis_struc._sub_onsite[idx]].position[0:space_size]
 
                 # make an array of positions of sites where the onsite disorder will be added
-                pos = pos_sub + np.dot(vectors.T, np.array(dis_struc._rel_idx_onsite[idx]))
+                pos = pos_sub + np.dot(vectors_T, np.array(dis_struc._rel_idx_onsite[idx]))
                 select_pos = positions + pos
 
                 # add the onsite with value dis_struc._onsite[idx]
@@ -951,13 +1072,53 @@ def make_pybinding_model(lattice, disorder=None, disorder_structural=None, **kwa
     return model
 
 
-def estimate_bounds(lattice, disorder=None, disorder_structural=None):
-    model = make_pybinding_model(lattice, disorder, disorder_structural)
+def estimate_bounds(lattice, disorder=None, disorder_structural=None, seed=None):
+    model = make_pybinding_model(lattice, disorder, disorder_structural, seed=seed)
     kpm = pb.kpm(model)
     a, b = kpm.scaling_factors
     return -a + b, a + b
 
 
+def _one_bound(args):
+    """Unpack the (lattice, disorder, disorder_structural, seed) tuple for estimate_bounds, used by the process pool."""
+    return estimate_bounds(*args)
+
+
+def estimate_bounds_many(lattice, disorder_list, disorder_struc_list, n_cpus=None, seed=None):
+    """Estimate the spectrum bounds for several disorder configurations of the same lattice in parallel.
+
+    The workers are separate processes. With the spawn start method, the default on macOS and Windows, every worker
+    imports the calling script again, so the call has to be placed under `if __name__ == '__main__':`.
+
+    Parameters
+    ----------
+    lattice : pb.Lattice
+        Pybinding lattice object that carries the info about the unit cell vectors, unit cell cites, hopping terms and
+        onsite energies.
+    disorder_list : list
+        Disorder (or list of Disorder objects, or None) for each of the configurations.
+    disorder_struc_list : list
+        StructuralDisorder (or list of StructuralDisorder objects, or None) for each of the configurations, of the same
+        length as disorder_list.
+    n_cpus : int
+        Number of worker processes, defaults to the number of CPUs.
+    seed : int
+        Seed of the random number generator of the disorder, the same for each of the configurations. The disorder is
+        not reproducible if it is not specified.
+
+    Returns
+    -------
+    list
+        (e_min, e_max) estimate for each of the configurations.
+    """
+    if len(disorder_list) != len(disorder_struc_list):
+        raise SystemExit('Lists of disorder and structural disorder configurations should be of the same length!')
+
+    args = [(lattice, dis, dis_struc, seed) for dis, dis_struc in zip(disorder_list, disorder_struc_list)]
+    with multiprocessing.Pool(n_cpus) as pool:
+        return pool.map(_one_bound, args)
+
+
 def config_system(lattice, config, calculation, **kwargs):
     """Export the lattice and related parameters to the *.h5 file
 
@@ -971,7 +1132,8 @@ def config_system(lattice, config, calculation, **kwargs):
         in the calculation.
     calculation : Calculation
         Calculation object that defines the requested functions for the calculation.
-    **kwargs: Optional arguments like filename, Disorder or Disorder_structural.
+    **kwargs: Optional arguments like filename, Disorder or Disorder_structural, and seed of the random number
+        generator used for the disorder in the automatic scaling.
 
     """
 
@@ -993,10 +1155,9 @@ def config_system(lattice, config, calculation, **kwargs):
     complx = int(config.comp)
 
     # check if there are complex hoppings but identifier is_complex is 0
-    imag_part = 0
-    # loop through all hoppings
-    for name, hop in lattice.hoppings.items():
-        imag_part += np.linalg.norm(np.asarray(hop.energy).imag)
+    # a single norm over the imaginary parts of all the hopping energies
+    hopping_energies = [np.asarray(hop.energy).ravel() for hop in lattice.hoppings.values()]
+    imag_part = np.linalg.norm(np.concatenate(hopping_energies).imag) if hopping_energies else 0
     if imag_part > 0 and complx == 0:
         print('Complex hoppings are added but is_complex identifier is 0. Automatically turning is_complex to 1!')
         config._is_complex = 1
@@ -1016,7 +1177,7 @@ def config_system(lattice, config, calculation, **kwargs):
         print('\nAutomatic scaling is being done. If unexpected results are produced, consider '
               '\nselecting the bounds manually. '
               '\nEstimate of the spectrum bounds with a safety factor is: ')
-        e_min, e_max = estimate_bounds(lattice, disorder, disorder_structural)
+        e_min, e_max = estimate_bounds(lattice, disorder, disorder_structural, seed=kwargs.get('seed', None))
         print('({:.2f}, {:.2f} eV)\n'.format(e_min, e_max))
         # add a safety factor for a scaling factor
         config._energy_scale = (e_max - e_min) / (2 * 0.9)
@@ -1030,9 +1191,17 @@ def config_system(lattice, config, calculation, **kwargs):
     space_size = vectors.shape[0]
     vectors = vectors[:, 0:space_size]
 
-    # iterate through all the sublattices and add onsite energies to hoppings list
+    # hoppings are stored as a structure of arrays, with one entry for each hopping term. Every hopping is followed by
+    # its conjugate in the opposite direction, and the onsite energies are the hoppings with the relative index 0
+    # from a sublattice to itself.
+    num_terms = lattice.nsub + 2 * sum(len(hop.terms) for hop in lattice.hoppings.values())
+    hop_rel_idx = np.zeros((num_terms, space_size), dtype=np.int32)
+    hop_from_ids = np.empty(num_terms, dtype=np.int32)
+    hop_to_ids = np.empty(num_terms, dtype=np.int32)
+    hop_energies = []
+
+    # iterate through all the sublattices and add onsite energies to hoppings
     # count num of orbitals and read the atom positions.
-    hoppings = []
     # get number of orbitals at each atom.
     num_orbitals = np.zeros(lattice.nsub, dtype=np.int64)
     # get all atom positions to the position array.
@@ -1043,94 +1212,74 @@ def config_system(lattice, config, calculation, **kwargs):
         num_orbitals[sub.alias_id] = num_energies
         # position_atoms is a list of vectors of size space_size
         position_atoms[sub.alias_id, :] = sub.position[0:space_size]
-        # define hopping dict from relative hopping index from and to id (relative number of sublattice in relative
-        # index lattice) and onsite
-        # energy shift is substracted from onsite potential, this is later added to the hopping dictionary,
+        # define the onsite hopping with the relative index 0, from and to id of the sublattice
+        # energy shift is substracted from onsite potential, this is later added to the hoppings,
         # hopping terms shouldn't be substracted
-        hopping = {'relative_index': np.zeros(space_size, dtype=np.int32), 'from_id': sub.alias_id,
-                   'to_id': sub.alias_id, 'hopping_energy': sub.energy - config.energy_shift}
-        hoppings.append(hopping)
+        idx_term = len(hop_energies)
+        hop_from_ids[idx_term] = hop_to_ids[idx_term] = sub.alias_id
+        hop_energies.append(sub.energy - config.energy_shift)
 
-    # num_orbitals = np.asarray(num_orbitals)
-    position_atoms = np.array(position_atoms)
     # repeats the positions of atoms based on the number of orbitals
     position = np.repeat(position_atoms, num_orbitals, axis=0)
+    # number of orbitals before i-th sublattice, where is is the array index
+    orbitals_before = np.empty_like(num_orbitals)
+    orbitals_before[0] = 0
+    np.cumsum(num_orbitals[:-1], out=orbitals_before[1:])
 
-    # iterate through all the hoppings and add hopping energies to hoppings list
+    # iterate through all the hoppings and add hopping energies to hoppings
     for name, hop in lattice.hoppings.items():
         hopping_energy = hop.energy
         for term in hop.terms:
-            hopping = {'relative_index': term.relative_index[0:space_size], 'from_id': term.from_id,
-                       'to_id': term.to_id, 'hopping_energy': hopping_energy}
-            hoppings.append(hopping)
-            # if the unit cell is [0, 0]
-            if np.linalg.norm(term.relative_index[0:space_size]) == 0:
-                hopping = {'relative_index': term.relative_index[0:space_size], 'from_id': term.to_id,
-                           'to_id': term.from_id, 'hopping_energy': np.conj(hopping_energy)}
-                hoppings.append(hopping)
-            # if the unit cell [i, j] is different than [0, 0] and also -[i, j] hoppings with opposite direction
-            if np.linalg.norm(term.relative_index[0:space_size]):
-                hopping = {'relative_index': -term.relative_index[0:space_size], 'from_id': term.to_id,
-                           'to_id': term.from_id, 'hopping_energy': np.conj(hopping_energy)}
-                hoppings.append(hopping)
-
-    orbital_from = []
-    orbital_to = []
-    orbital_hop = []
-    # number of orbitals before i-th sublattice, where is is the array index
-    orbitals_before = np.cumsum(num_orbitals) - num_orbitals
+            idx_term = len(hop_energies)
+            relative_index = term.relative_index[0:space_size]
+            # hopping from the unit cell [i, j] followed by the -[i, j] hopping with opposite direction, for the unit
+            # cell [0, 0] both are in the same unit cell
+            hop_rel_idx[idx_term] = relative_index
+            hop_rel_idx[idx_term + 1] = -relative_index
+            hop_from_ids[idx_term:idx_term + 2] = term.from_id, term.to_id
+            hop_to_ids[idx_term:idx_term + 2] = term.to_id, term.from_id
+            hop_energies.extend((hopping_energy, np.conj(hopping_energy)))
+
     # iterate through all hoppings, and define unique orbital hoppings
     # orbital_to in unit cell [i, j] is defined  as [i, j] x [1, 3] + relative_orbital_num*3**2 2D
     # orbital_to in unit cell [i, j, k] is defined  as [i, j, k] x [1, 3, 9] + relative_orbital_num*3**3 3D
     # relative index of orbital_from is unique as only hoppings from the orbitals in the initial unit cell are exported
-    for h in hoppings:
-        hopping_energy = h['hopping_energy']
-        it = np.nditer(hopping_energy, flags=['multi_index'])
-        while not it.finished:
-            relative_move = np.dot(h['relative_index'] + 1,
-                                   3 ** np.linspace(0, space_size - 1, space_size, dtype=np.int32))
-            # if hopping_energy.size > 1:
-            orbital_from.append(orbitals_before[h['from_id']] + it.multi_index[0])
-            orbital_to.append(relative_move + (orbitals_before[h['to_id']] + it.multi_index[1]) * 3 ** space_size)
-            # else:
-            #     orbital_from.append(h['from_id'])
-            #     orbital_to.append(relative_move + h['to_id'] * 3 ** space_size)
-
-            orbital_hop.append(it[0] if complx else np.real(it[0]))
-
-            it.iternext()
+    powers = 3 ** np.arange(space_size, dtype=np.int32)
+    base = int(3 ** space_size)
+    relative_moves = (hop_rel_idx + 1) @ powers
+    orbital_from, orbital_to, orbital_hop = _enumerate_hoppings(relative_moves, hop_from_ids, hop_to_ids, hop_energies,
+                                                                orbitals_before, base)
+    if not complx:
+        orbital_hop = orbital_hop.real
 
     # extract t - hoppings where each row corresponds to hopping from row number orbital and d - for each hopping it's
     # unique identifier
-    t_list = []
-    d_list = []
-    # make a sparse matrix from orbital_hop, and (orbital_from, orbital_to) as it's easier to take nonzero hoppings from
-    # sparse matrix
-    matrix = coo_matrix((orbital_hop, (orbital_from, orbital_to)),
-                        shape=(np.max(orbital_from) + 1, np.max(orbital_to) + 1))
+    # hoppings are sorted by the unique (orbital_from, orbital_to) key, duplicate entries are summed and vanishing ones
+    # are dropped
+    num_rows = int(np.max(orbital_from)) + 1
+    num_cols = int(np.max(orbital_to)) + 1
+    key = orbital_from.astype(np.int64) * num_cols + orbital_to
+    order = np.argsort(key, kind='stable')
+    unique_keys, first = np.unique(key[order], return_index=True)
+    hop_values = np.add.reduceat(orbital_hop[order], first)
+    nonzero = hop_values != 0
+    hop_from, hop_to = np.divmod(unique_keys[nonzero], num_cols)
+    hop_values = hop_values[nonzero]
     # num_hoppings is a vector where each value corresponds to num of hoppings from orbital equal to it's index
-    num_hoppings = np.zeros(matrix.shape[0])
-    # iterate through all rows of matrix, number of row = number of orbital from
-
-    for i in range(matrix.shape[0]):
-        # all hoppings from orbital i
-        row_mat = matrix.getrow(i)
-        # number of hoppings from orbital i
-        num_hoppings[i] = row_mat.size
-
-        t_list.append(row_mat.data)
-        d_list.append(row_mat.indices)
+    num_hoppings = np.bincount(hop_from, minlength=num_rows).astype(np.int32)
 
     # fix the size of hopping and distance matrices, where the number of columns is max number of hoppings
     max_hop = int(np.max(num_hoppings))
-    d = np.zeros((matrix.shape[0], max_hop))
-    t = np.zeros((matrix.shape[0], max_hop), dtype=matrix.data.dtype)
-    for i_row, d_row in enumerate(d_list):
-        t_row = t_list[i_row]
-        d[i_row, :len(d_row)] = d_row
-        t[i_row, :len(t_row)] = t_row
+    # column of each hopping inside the padded d and t matrices, the hoppings of a row are contiguous after the sort
+    col_idx = np.arange(hop_values.size) - (np.cumsum(num_hoppings) - num_hoppings)[hop_from]
+    d = np.zeros((num_rows, max_hop), dtype=np.int32)
+    t = np.zeros((num_rows, max_hop), dtype=hop_values.dtype)
+    d[hop_from, col_idx] = hop_to
+    t[hop_from, col_idx] = hop_values
 
-    f = hp.File(filename, 'w')
+    # newest object formats that are still readable by HDF5 1.8, the oldest library supported by the C++ code.
+    # Every dataset is written once as a whole, so the raw data chunk cache is disabled.
+    f = hp.File(filename, 'w', libver=('v108', 'v108'), track_order=False, rdcc_nbytes=0)
 
     f.create_dataset('IS_COMPLEX', data=complx, dtype='u4')
     # precision of hamiltonian float, double, long double
@@ -1160,7 +1309,8 @@ def config_system(lattice, config, calculation, **kwargs):
     # lattice vectors. Size is same as DIM
     f.create_dataset('LattVectors', data=vectors, dtype=np.float64)
     # position for each atom
-    f.create_dataset('OrbPositions', data=position, dtype=np.float64)
+    f.create_dataset('OrbPositions', data=np.ascontiguousarray(position, dtype=np.float64),
+                     **config.h5_options(position.shape))
     # total number of orbitals
     f.create_dataset('NOrbitals', data=np.sum(num_orbitals), dtype='u4')
     # scaling factor for the hopping parameters
@@ -1172,14 +1322,15 @@ def config_system(lattice, config, calculation, **kwargs):
     # Hamiltonian group
     grp.create_dataset('NHoppings', data=num_hoppings, dtype='u4')
     # distance
-    grp.create_dataset('d', data=d, dtype='i4')
+    grp.create_dataset('d', data=np.ascontiguousarray(d), dtype='i4', **config.h5_options(d.shape))
 
     if complx:
         # hoppings
-        grp.create_dataset('Hoppings', data=(t.astype(config.type)) / config.energy_scale)
+        hoppings_data = (t.astype(config.type)) / config.energy_scale
     else:
         # hoppings
-        grp.create_dataset('Hoppings', data=(t.real.astype(config.type)) / config.energy_scale)
+        hoppings_data = (t.real.astype(config.type)) / config.energy_scale
+    grp.create_dataset('Hoppings', data=np.ascontiguousarray(hoppings_data), **config.h5_options(t.shape))
 
     grp_dis = grp.create_group('Disorder')
 
@@ -1201,223 +1352,101 @@ def config_system(lattice, config, calculation, **kwargs):
     grp_dis_vac = grp.create_group('Vacancy')
     idx_vacancy = 0
     grp_dis = grp.create_group('StructuralDisorder')
-    if disorder_structural:
-
-        if isinstance(disorder_structural, list):
-            num_dis = len(disorder_structural)
-        else:
-            num_dis = 1
-            disorder_structural = [disorder_structural]
-
-        for idx in range(num_dis):
-
-            disorder_struct = disorder_structural[idx]
-
-            num_orb_vac = len(disorder_struct._orbital_vacancy)
-            if num_orb_vac > 0:
-                grp_dis_type = grp_dis_vac.create_group('Type{val}'.format(val=idx_vacancy))
-                grp_dis_type.create_dataset('Orbitals', data=np.asarray(disorder_struct._orbital_vacancy),
-                                            dtype=np.int32)
-                grp_dis_type.create_dataset('Concentration', data=disorder_struct._concentration,
-                                            dtype=np.float64)
-                grp_dis_type.create_dataset('NumOrbitals', data=num_orb_vac, dtype=np.int32)
-                idx_vacancy += 1
-
-            if disorder_struct._num_bond_disorder_per_type or disorder_struct._num_onsite_disorder_per_type:
-                # Type idx
-                grp_dis_type = grp_dis.create_group('Type{val}'.format(val=idx))
-                # Concentration of this type
-                grp_dis_type.create_dataset('Concentration', data=np.asarray(disorder_struct._concentration),
-                                            dtype=np.float64)
-                # Number of bond disorder
-                grp_dis_type.create_dataset('NumBondDisorder',
-                                            data=2 * np.asarray(disorder_struct._num_bond_disorder_per_type),
-                                            dtype=np.int32)
-                # Number of onsite disorder
-                grp_dis_type.create_dataset('NumOnsiteDisorder',
-                                            data=np.asarray(disorder_struct._num_onsite_disorder_per_type),
-                                            dtype=np.int32)
-
-                # Node of the bond disorder from
-                grp_dis_type.create_dataset('NodeFrom', data=np.asarray(disorder_struct._nodes_from).flatten(),
-                                            dtype=np.int32)
-                # Node of the bond disorder to
-                grp_dis_type.create_dataset('NodeTo', data=np.asarray(disorder_struct._nodes_to).flatten(),
-                                            dtype=np.int32)
-                # Node of the onsite disorder
-                grp_dis_type.create_dataset('NodeOnsite', data=np.asarray(disorder_struct._nodes_onsite),
-                                            dtype=np.int32)
-
-                # Num nodes
-                grp_dis_type.create_dataset('NumNodes', data=disorder_struct._num_nodes, dtype=np.int32)
-                # Orbital mapped for this node
-                grp_dis_type.create_dataset('NodePosition', data=np.asarray(disorder_struct._node_orbital),
-                                            dtype=np.uint32)
-
-                # Onsite disorder energy
-                grp_dis_type.create_dataset('U0',
-                                            data=(np.asarray(disorder_struct._disorder_onsite).real.astype(
-                                                config.type)) / config.energy_scale)
-                # Bond disorder hopping
-                disorder_hopping = disorder_struct._disorder_hopping
-                if complx:
-                    # hoppings
-                    grp_dis_type.create_dataset('Hopping',
-                                                data=(np.asarray(disorder_hopping).astype(
-                                                    config.type).flatten()) / config.energy_scale)
-                else:
-                    # hoppings
-                    grp_dis_type.create_dataset('Hopping',
-                                                data=(np.asarray(disorder_hopping).real.astype(
-                                                    config.type).flatten()) / config.energy_scale)
+    for idx, disorder_struct in enumerate(_aslist(disorder_structural)):
+        num_orb_vac = len(disorder_struct._orbital_vacancy)
+        if num_orb_vac > 0:
+            grp_dis_type = grp_dis_vac.create_group('Type{val}'.format(val=idx_vacancy))
+            grp_dis_type.create_dataset('Orbitals', data=np.asarray(disorder_struct._orbital_vacancy),
+                                        dtype=np.int32)
+            grp_dis_type.create_dataset('Concentration', data=disorder_struct._concentration,
+                                        dtype=np.float64)
+            grp_dis_type.create_dataset('NumOrbitals', data=num_orb_vac, dtype=np.int32)
+            idx_vacancy += 1
+
+        if disorder_struct._num_bond_disorder_per_type or disorder_struct._num_onsite_disorder_per_type:
+            # Type idx
+            grp_dis_type = grp_dis.create_group('Type{val}'.format(val=idx))
+            # Concentration of this type
+            grp_dis_type.create_dataset('Concentration', data=np.asarray(disorder_struct._concentration),
+                                        dtype=np.float64)
+            # Number of bond disorder entries, each bond of every term followed by its conjugate
+            grp_dis_type.create_dataset('NumBondDisorder', data=disorder_struct._hop_flat.size, dtype=np.int32)
+            # Number of onsite disorder entries, one for each orbital of every term
+            grp_dis_type.create_dataset('NumOnsiteDisorder', data=disorder_struct._onsite_flat.size,
+                                        dtype=np.int32)
+
+            # Node of the bond disorder from
+            grp_dis_type.create_dataset('NodeFrom', data=disorder_struct._nodes_from_flat, dtype=np.int32,
+                                        **config.h5_options(disorder_struct._nodes_from_flat.shape))
+            # Node of the bond disorder to
+            grp_dis_type.create_dataset('NodeTo', data=disorder_struct._nodes_to_flat, dtype=np.int32,
+                                        **config.h5_options(disorder_struct._nodes_to_flat.shape))
+            # Node of the onsite disorder
+            grp_dis_type.create_dataset('NodeOnsite', data=disorder_struct._nodes_onsite_flat, dtype=np.int32,
+                                        **config.h5_options(disorder_struct._nodes_onsite_flat.shape))
+
+            # Num nodes
+            grp_dis_type.create_dataset('NumNodes', data=disorder_struct._num_nodes, dtype=np.int32)
+            # Orbital mapped for this node
+            grp_dis_type.create_dataset('NodePosition', data=np.asarray(disorder_struct._node_orbital),
+                                        dtype=np.uint32)
+
+            # Onsite disorder energy
+            grp_dis_type.create_dataset('U0',
+                                        data=(disorder_struct._onsite_flat.real.astype(
+                                            config.type)) / config.energy_scale,
+                                        **config.h5_options(disorder_struct._onsite_flat.shape))
+            # Bond disorder hopping
+            disorder_hopping = disorder_struct._hop_flat
+            if complx:
+                # hoppings
+                grp_dis_type.create_dataset('Hopping',
+                                            data=(disorder_hopping.astype(config.type)) / config.energy_scale,
+                                            **config.h5_options(disorder_hopping.shape))
+            else:
+                # hoppings
+                grp_dis_type.create_dataset('Hopping',
+                                            data=(disorder_hopping.real.astype(config.type)) / config.energy_scale,
+                                            **config.h5_options(disorder_hopping.shape))
 
     # Calculation function defined with num_moments, num_random vectors, and num_disorder etc. realisations
+    # energy scaling of the calculation parameters, with the scale inverted only once
+    inv_scale = 1.0 / config.energy_scale
+    shift = config.energy_shift
+    # requested functions with the single value fields of their groups
+    calc_requests = (('dos', calculation.get_dos, _CALC_FIELDS_DOS),
+                     ('conductivity_dc', calculation.get_conductivity_dc, _CALC_FIELDS_COND),
+                     ('conductivity_optical', calculation.get_conductivity_optical, _CALC_FIELDS_COND),
+                     ('conductivity_optical_nonlinear', calculation.get_conductivity_optical_nonlinear,
+                      _CALC_FIELDS_NONLINEAR),
+                     ('singleshot_conductivity_dc', calculation.get_singleshot_conductivity_dc,
+                      _CALC_FIELDS_SINGLESHOT))
+    # only a single request of each function is allowed, checked once before any of the groups is written
+    if any(len(entries) > 1 for _, entries, _ in calc_requests):
+        raise SystemExit('Only a single function request of each type is currently allowed. Please use another '
+                         'configuration file for the same functionality.')
+
     grpc = f.create_group('Calculation')
-    if calculation.get_dos:
-        grpc_p = grpc.create_group('dos')
-
-        moments, random, point, dis, temp, direction = [], [], [], [], [], []
-        for single_dos in calculation.get_dos:
-            moments.append(single_dos['num_moments'])
-            random.append(single_dos['num_random'])
-            point.append(single_dos['num_points'])
-            dis.append(single_dos['num_disorder'])
-
-        if len(calculation.get_dos) > 1:
-            raise SystemExit('Only a single function request of each type is currently allowed. Please use another '
-                             'configuration file for the same functionality.')
-        grpc_p.create_dataset('NumMoments', data=moments, dtype=np.int32)
-        grpc_p.create_dataset('NumRandoms', data=random, dtype=np.int32)
-        grpc_p.create_dataset('NumPoints', data=point, dtype=np.int32)
-        grpc_p.create_dataset('NumDisorder', data=dis, dtype=np.int32)
-
-    if calculation.get_conductivity_dc:
-        grpc_p = grpc.create_group('conductivity_dc')
-
-        moments, random, point, dis, temp, direction = [], [], [], [], [], []
-        for single_cond_dc in calculation.get_conductivity_dc:
-            moments.append(single_cond_dc['num_moments'])
-            random.append(single_cond_dc['num_random'])
-            point.append(single_cond_dc['num_points'])
-            dis.append(single_cond_dc['num_disorder'])
-            temp.append(single_cond_dc['temperature'])
-            direction.append(single_cond_dc['direction'])
-
-        if len(calculation.get_conductivity_dc) > 1:
-            raise SystemExit('Only a single function request of each type is currently allowed. Please use another '
-                             'configuration file for the same functionality.')
-        grpc_p.create_dataset('NumMoments', data=np.asarray(moments), dtype=np.int32)
-        grpc_p.create_dataset('NumRandoms', data=np.asarray(random), dtype=np.int32)
-        grpc_p.create_dataset('NumPoints', data=np.asarray(point), dtype=np.int32)
-        grpc_p.create_dataset('NumDisorder', data=np.asarray(dis), dtype=np.int32)
-        grpc_p.create_dataset('Temperature', data=np.asarray(temp) / config.energy_scale, dtype=np.float64)
-        grpc_p.create_dataset('Direction', data=np.asarray(direction), dtype=np.int32)
-
-    if calculation.get_conductivity_optical:
-        grpc_p = grpc.create_group('conductivity_optical')
-
-        moments, random, point, dis, temp, direction = [], [], [], [], [], []
-        for single_cond_opt in calculation.get_conductivity_optical:
-            moments.append(single_cond_opt['num_moments'])
-            random.append(single_cond_opt['num_random'])
-            point.append(single_cond_opt['num_points'])
-            dis.append(single_cond_opt['num_disorder'])
-            temp.append(single_cond_opt['temperature'])
-            direction.append(single_cond_opt['direction'])
-
-        if len(calculation.get_conductivity_optical) > 1:
-            raise SystemExit('Only a single function request of each type is currently allowed. Please use another '
-                             'configuration file for the same functionality.')
-        grpc_p.create_dataset('NumMoments', data=np.asarray(moments), dtype=np.int32)
-        grpc_p.create_dataset('NumRandoms', data=np.asarray(random), dtype=np.int32)
-        grpc_p.create_dataset('NumPoints', data=np.asarray(point), dtype=np.int32)
-        grpc_p.create_dataset('NumDisorder', data=np.asarray(dis), dtype=np.int32)
-        grpc_p.create_dataset('Temperature', data=np.asarray(temp) / config.energy_scale, dtype=np.float64)
-        grpc_p.create_dataset('Direction', data=np.asarray(direction), dtype=np.int32)
-
-    if calculation.get_conductivity_optical_nonlinear:
-        grpc_p = grpc.create_group('conductivity_optical_nonlinear')
-
-        moments, random, point, dis, temp, direction, special = [], [], [], [], [], [], []
-        for single_cond_opt_non in calculation.get_conductivity_optical_nonlinear:
-            moments.append(single_cond_opt_non['num_moments'])
-            random.append(single_cond_opt_non['num_random'])
-            point.append(single_cond_opt_non['num_points'])
-            dis.append(single_cond_opt_non['num_disorder'])
-            temp.append(single_cond_opt_non['temperature'])
-            direction.append(single_cond_opt_non['direction'])
-            special.append(single_cond_opt_non['special'])
-
-        if len(calculation.get_conductivity_optical_nonlinear) > 1:
-            raise SystemExit('Only a single function request of each type is currently allowed. Please use another '
-                             'configuration file for the same functionality.')
-        grpc_p.create_dataset('NumMoments', data=np.asarray(moments), dtype=np.int32)
-        grpc_p.create_dataset('NumRandoms', data=np.asarray(random), dtype=np.int32)
-        grpc_p.create_dataset('NumPoints', data=np.asarray(point), dtype=np.int32)
-        grpc_p.create_dataset('NumDisorder', data=np.asarray(dis), dtype=np.int32)
-        grpc_p.create_dataset('Temperature', data=np.asarray(temp) / config.energy_scale, dtype=np.float64)
-        grpc_p.create_dataset('Direction', data=np.asarray(direction), dtype=np.int32)
-        grpc_p.create_dataset('Special', data=np.asarray(special), dtype=np.int32)
+    # the singleshot function, last in the table, also writes its arrays and is exported below
+    for name, entries, field_specs in calc_requests[:-1]:
+        if entries:
+            _write_calc_group(grpc, name, entries[0], field_specs, inv_scale)
 
     if calculation.get_singleshot_conductivity_dc:
-        grpc_p = grpc.create_group('singleshot_conductivity_dc')
-
-        moments, random, dis, energies, eta, direction, preserve_disorder = [], [], [], [], [], [], []
-
-        for single_singlshot_cond in calculation.get_singleshot_conductivity_dc:
-
-            energy_ = single_singlshot_cond['energy']
-            eta_ = single_singlshot_cond['eta']
-            preserve_disorder_ = single_singlshot_cond['preserve_disorder']
-            moments_ = single_singlshot_cond['num_moments']
-
-            # get the lengts
-            len_en = energy_.size
-            len_eta = eta_.size
-            len_preserve_dis = preserve_disorder_.size
-            len_moments = moments_.size
-
-            lengths = np.array([len_en, len_eta, len_preserve_dis, len_moments])
-
-            # find the max length
-            max_length = np.max(lengths)
-
-            # check if lenghts are consistent
-            if (len_en != max_length and len_en != 1) or (len_eta != max_length and len_eta != 1) or \
-                    (len_preserve_dis != max_length and len_preserve_dis != 1) or \
-                    (len_moments != max_length and len_moments != 1):
-                raise SystemExit('Number of moments, eta, energy and preserve_disorder should either have the same '
-                                 'length or specified as a single value! Choose them accordingly.')
-
-            # make all lists equal in length
-            if len_en == 1:
-                energy_ = np.repeat(energy_, max_length)
-            if len_eta == 1:
-                eta_ = np.repeat(eta_, max_length)
-            if len_preserve_dis == 1:
-                preserve_disorder_ = np.repeat(preserve_disorder_, max_length)
-            if len_moments == 1:
-                moments_ = np.repeat(moments_, max_length)
-
-            moments.append(moments_)
-            energies.append(energy_)
-            eta.append(eta_)
-            random.append(single_singlshot_cond['num_random'])
-            dis.append(single_singlshot_cond['num_disorder'])
-            direction.append(single_singlshot_cond['direction'])
-            preserve_disorder.append(preserve_disorder_)
-
-        if len(calculation.get_singleshot_conductivity_dc) > 1:
-            raise SystemExit('Only a single function request of each type is currently allowed. Please use another '
-                             'configuration file for the same functionality.')
-        grpc_p.create_dataset('NumMoments', data=np.asarray(moments), dtype=np.int32)
-        grpc_p.create_dataset('NumRandoms', data=np.asarray(random), dtype=np.int32)
-        grpc_p.create_dataset('NumDisorder', data=np.asarray(dis), dtype=np.int32)
-        grpc_p.create_dataset('Energy', data=(np.asarray(energies) - config.energy_shift) / config.energy_scale,
-                              dtype=np.float64)
-        grpc_p.create_dataset('Gamma', data=np.asarray(eta) / config.energy_scale, dtype=np.float64)
-        grpc_p.create_dataset('Direction', data=np.asarray(direction), dtype=np.int32)
-        grpc_p.create_dataset('PreserveDisorder', data=np.asarray(preserve_disorder).astype(int), dtype=np.int32)
+        single_singlshot_cond = calculation.get_singleshot_conductivity_dc[0]
+        grpc_p = _write_calc_group(grpc, 'singleshot_conductivity_dc', single_singlshot_cond, _CALC_FIELDS_SINGLESHOT,
+                                   inv_scale)
+
+        # make all arrays equal in length, single values are broadcast as views without copying
+        moments_, energy_, eta_, preserve_disorder_ = _broadcast4(
+            single_singlshot_cond['num_moments'], single_singlshot_cond['energy'], single_singlshot_cond['eta'],
+            single_singlshot_cond['preserve_disorder'])
+
+        # the arrays are stored with a single row, one for each function request
+        _ds(grpc_p, 'NumMoments', moments_[np.newaxis], np.int32)
+        _ds(grpc_p, 'Energy', (np.asarray(energy_[np.newaxis], dtype=np.float64) - shift) * inv_scale, np.float64)
+        _ds(grpc_p, 'Gamma', np.asarray(eta_[np.newaxis], dtype=np.float64) * inv_scale, np.float64)
+        _ds(grpc_p, 'PreserveDisorder', np.asarray(preserve_disorder_[np.newaxis], dtype=np.int32), np.int32)
 
     print('\n##############################################################################\n')
     print('OUTPUT:\n')